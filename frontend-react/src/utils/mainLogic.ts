@@ -691,21 +691,19 @@ async function captureAndDetect() {
   tempCtx.drawImage(video, 0, 0, tempCanvas.width, tempCanvas.height);
   
   try {
-    // Convert canvas to base64 image
-    const base64Image = tempCanvas.toDataURL('image/jpeg', 0.8);
+    // Encode canvas as raw JPEG bytes (no base64 overhead)
+    const jpegBlob = await new Promise<Blob | null>(resolve => tempCanvas.toBlob(resolve, 'image/jpeg', 0.8));
+    if (!jpegBlob) return;
     
-    // Prepare JSON payload for backend
-    const payload = {
-      image: base64Image,
-      queries: ["person", "car", "bicycle", "motorcycle", "bus", "truck", "dog", "cat", "laptop", "phone", "book", "chair", "table", "cup", "bottle"]
-    };
+    // Prepare multipart payload for backend
+    const payload = new FormData();
+    payload.append('file', jpegBlob, 'frame.jpg');
+    // No queries: the dashboard shows every class the model detects
+    payload.append('queries', JSON.stringify([]));
     
-    const response = await fetch(`${config.apiUrl}/detect`, {
+    const response = await fetch(`${config.apiUrl}/detect-bin`, {
       method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify(payload)
+      body: payload
     });
     
     if (!response.ok) {
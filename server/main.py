@@ -4,34 +4,66 @@ import logging
 import os
 import uuid
 import base64
+import binascii
 import io
+import queue
 import socket
+import shutil
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+# Threads running YOLO off the event loop (PyTorch/OpenVINO kernels release the GIL).
+# Set before the numeric imports so OpenMP sizes its pool for workers x threads <= cores.
+INFERENCE_WORKERS = 2
+THREADS_PER_WORKER = max(1, (os.cpu_count() or 1) // INFERENCE_WORKERS)
+os.environ.setdefault("OMP_NUM_THREADS", str(THREADS_PER_WORKER))
+
 import cv2
 import numpy as np
+import orjson
 import requests
 import qrcode
 from fastapi import FastAPI, HTTPException, Form, File, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel
-from aiortc import MediaStreamTrack, RTCPeerConnection, RTCSessionDescription
+from aiortc import RTCPeerConnection, RTCSessionDescription
 from aiortc.contrib.media import MediaRelay
 
 # For YOLO
-from PIL import Image
 import torch
+from torchvision.ops import batched_nms
 from ultralytics import YOLO
+from ultralytics.nn.autobackend import AutoBackend
 
 # --- Configuration ---
 ROOT = Path(__file__).parent
 YOLO_MODEL = "yolov5n.pt"  # YOLOv5 nano quantized for fastest inference
+IMG_SIZE = 640
+INFERENCE_SIZES = (320, 480, 640)  # Small frames run at the smallest size that covers them (dynamic backends)
+CONF_THRESHOLD = 0.25
+IOU_THRESHOLD = 0.45
+MAX_DETECTIONS = 300  # Per frame, after NMS
+LETTERBOX_PAD = 114 / 255  # Normalized border colour for letterboxed frames
 PORT = 8080
 
+# TensorRT FP16 engine (CUDA). Static 640x640 batch-1 engine, built once and cached.
+TENSORRT_ENGINE = ROOT / f"{Path(YOLO_MODEL).stem}.engine"
+
+# OpenVINO INT8 export (CPU). Exported once, then reused from disk on every boot.
+USE_OPENVINO = os.getenv("USE_OPENVINO", "1") == "1"
+OPENVINO_MODEL_DIR = ROOT / f"{Path(YOLO_MODEL).stem}_int8_openvino_model"
+INT8_CALIBRATION_DATA = "coco128.yaml"  # Small COCO subset used to calibrate INT8 ranges
+
+# Micro-batching of concurrent /detect requests
+MAX_BATCH_SIZE = 8
+MAX_QUEUE_DELAY = 0.01  # Seconds to wait for more frames before running a partial batch
+
+QUERY_ALIASES = {"phone": "cell phone", "table": "dining table"}  # Client query names that aren't COCO names
+
 # --- FastAPI Setup ---
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)  # orjson encodes the many box floats in C
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -41,48 +73,132 @@ app.add_middleware(
 )
 
 # --- Global variables ---
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
 pcs = set()
 relay = MediaRelay()
+real_ip = None  # Resolved once on startup by get_local_ip()
+qr_code_png = None  # Phone-page QR code, rendered once on startup
+network_info_json = None  # /network-info payload, built and encoded once on startup
 
 # --- Helper Functions ---
 def get_local_ip():
-    """Get the Windows host machine's IP address (not Docker container IP)"""
+    """Get the Windows host machine's IP address (not Docker container IP).
+
+    Called once on startup; the result is kept in `real_ip`.
+    """
     try:
         # Method 1: Check for HOST_IP environment variable (set by docker-compose)
         host_ip = os.getenv('HOST_IP')
         if host_ip:
-            print(f"Using HOST_IP from environment: {host_ip}")
+            logger.info("Using HOST_IP from environment: %s", host_ip)
             return host_ip
         
         # Method 2: For Docker, try to get host IP by connecting to external service
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.settimeout(2)
-        try:
+        # (UDP connect only picks a route, no packet or DNS lookup is sent)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.settimeout(2)
             s.connect(('8.8.8.8', 80))
             container_ip = s.getsockname()[0]
-            print(f"Container IP: {container_ip}")
-            
-            # If we're in Docker (172.x.x.x), use fallback
-            if container_ip.startswith('172.'):
-                print("Detected Docker container, using fallback IP")
-                return "10.71.252.230"  # Your current network IP as fallback
-            
-            return container_ip
-        finally:
-            s.close()
+        logger.info("Container IP: %s", container_ip)
         
-        # Method 3: Try hostname resolution fallback
-        hostname = socket.gethostname()
-        local_ip = socket.gethostbyname(hostname)
-        if not local_ip.startswith('127.'):
-            print(f"Hostname resolution IP: {local_ip}")
-            return local_ip
+        # If we're in Docker (172.x.x.x), use fallback
+        if container_ip.startswith('172.'):
+            logger.info("Detected Docker container, using fallback IP")
+            return "10.71.252.230"  # Your current network IP as fallback
         
-        return "localhost"
+        return container_ip
     except Exception as e:
-        print(f"Error getting local IP: {e}")
+        logger.warning("Error getting local IP: %s", e)
         return "localhost"
 
+def decode_frame(image_bytes: bytes) -> np.ndarray:
+    """Decode JPEG/PNG bytes into an HWC BGR uint8 array with OpenCV's libjpeg-turbo decoder"""
+    frame = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("Could not decode image")
+    return frame
+
+def letterbox_into(frame: np.ndarray, out: np.ndarray):
+    """Letterbox an HWC uint8 BGR frame into a preallocated CHW float32 RGB slot in a single pass.
+
+    Resize, BGR->RGB, HWC->CHW and /255 normalization all happen while writing into `out`.
+    Returns (ratio, pad_x, pad_y) for mapping boxes back to frame coordinates.
+    """
+    h, w = frame.shape[:2]
+    size = out.shape[-1]
+    ratio = min(size / h, size / w)
+    # At least one pixel, so very thin frames don't round down to an empty resize
+    new_w, new_h = max(1, round(w * ratio)), max(1, round(h * ratio))
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    if (new_w, new_h) != (w, h):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    # Grey border, same value ultralytics uses
+    out[:, :pad_y] = LETTERBOX_PAD
+    out[:, pad_y + new_h:] = LETTERBOX_PAD
+    out[:, :, :pad_x] = LETTERBOX_PAD
+    out[:, :, pad_x + new_w:] = LETTERBOX_PAD
+    # Write through an HWC view of the CHW slot: channel swap + transpose + normalize in one pass
+    hwc = out.transpose(1, 2, 0)[pad_y:pad_y + new_h, pad_x:pad_x + new_w]
+    np.multiply(frame[..., ::-1], np.float32(1 / 255), out=hwc)
+    return ratio, pad_x, pad_y
+
+def non_max_suppression(preds: torch.Tensor, classes=None):
+    """Confidence filter + class-aware NMS on raw YOLO output of shape (B, 4 + num_classes, N).
+
+    Boxes come in as cx, cy, w, h in model-input pixels. NMS runs in torchvision's
+    C++/CUDA kernel. Returns one (K, 6) tensor per image: x1, y1, x2, y2, conf, cls.
+    """
+    if classes is not None:
+        classes = torch.tensor(classes, device=preds.device)
+
+    output = []
+    for pred in preds.float().transpose(1, 2):  # (N, 4 + num_classes) per image
+        scores, cls = pred[:, 4:].max(1)
+        mask = scores > CONF_THRESHOLD
+        if classes is not None:
+            mask &= torch.isin(cls, classes)
+        xy, half_wh = pred[mask, :2], pred[mask, 2:4] / 2
+        boxes = torch.cat((xy - half_wh, xy + half_wh), 1)
+        scores, cls = scores[mask], cls[mask]
+
+        keep = batched_nms(boxes, scores, cls, IOU_THRESHOLD)[:MAX_DETECTIONS]
+        output.append(torch.cat((boxes[keep], scores[keep, None], cls[keep, None].float()), 1))
+    return output
+
+def query_class_ids(queries: list[str]):
+    """Map requested object names to a sorted tuple of class ids (None = no known class, don't filter)"""
+    class_ids = set()
+    for query in queries:
+        name = QUERY_ALIASES.get(query.lower(), query.lower())
+        if name in class_name_to_id:
+            class_ids.add(class_name_to_id[name])
+    return tuple(sorted(class_ids)) or None
+
+def build_network_info(real_ip: str) -> dict:
+    """Build the /network-info payload with both localhost and real IP options"""
+    frontend_port_http = 3000  # HTTP Frontend port
+    frontend_port_https = 3443  # HTTPS Frontend port
+    
+    return {
+        "real_ip": real_ip,
+        "localhost_ip": "localhost",
+        # HTTP URLs (for localhost/desktop)
+        "localhost_url": f"http://localhost:{frontend_port_http}",
+        "localhost_phone_url": f"http://localhost:{frontend_port_http}/phone",
+        # HTTPS URLs (for mobile access)
+        "real_ip_url": f"https://{real_ip}:{frontend_port_https}",
+        "real_ip_phone_url": f"https://{real_ip}:{frontend_port_https}/phone",
+        # Backward compatibility
+        "local_ip": real_ip,
+        "frontend_url": f"https://{real_ip}:{frontend_port_https}",
+        "phone_url": f"https://{real_ip}:{frontend_port_https}/phone"
+    }
+
 def generate_qr_code(url: str) -> bytes:
     """Generate QR code for the given URL"""
     qr = qrcode.QRCode(
@@ -104,51 +220,286 @@ def generate_qr_code(url: str) -> bytes:
 
 # --- YOLO Model Loading ---
 model = None
+model_batch_size = MAX_BATCH_SIZE  # Largest batch the loaded backend accepts
+model_dynamic_shapes = True  # Whether the loaded backend accepts input sizes other than IMG_SIZE
+class_names = []  # YOLO class names (COCO dataset), read from the loaded model
+class_name_to_id = {}
+inference_device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+model_pool = queue.SimpleQueue()  # Idle inference backends, one per worker (backends aren't thread-safe)
+input_buffers = queue.SimpleQueue()  # Preallocated (host, device) (batch, 3, IMG_SIZE, IMG_SIZE) inputs, one pair per worker
+
+def export_tensorrt_fp16() -> Path:
+    """Build a static FP16 TensorRT engine for YOLO_MODEL, reusing the cached engine if present"""
+    if TENSORRT_ENGINE.exists():
+        return TENSORRT_ENGINE
+
+    logger.info("Exporting %s to TensorRT FP16 (one-time, this can take a few minutes)...", YOLO_MODEL)
+    engine_path = YOLO(YOLO_MODEL).export(
+        format="engine", half=True, dynamic=False, workspace=4, imgsz=IMG_SIZE
+    )
+    shutil.move(engine_path, TENSORRT_ENGINE)
+    logger.info("TensorRT engine cached at: %s", TENSORRT_ENGINE)
+    return TENSORRT_ENGINE
+
+def export_openvino_int8() -> Path:
+    """Export YOLO_MODEL to an INT8 OpenVINO IR, reusing the cached export if present"""
+    if OPENVINO_MODEL_DIR.exists():
+        return OPENVINO_MODEL_DIR
+
+    logger.info(
+        "Exporting %s to OpenVINO INT8 (one-time, calibrating on %s)...", YOLO_MODEL, INT8_CALIBRATION_DATA
+    )
+    # Dynamic shapes so the micro-batcher can feed several frames at once
+    exported_dir = YOLO(YOLO_MODEL).export(
+        format="openvino", int8=True, dynamic=True, data=INT8_CALIBRATION_DATA, imgsz=IMG_SIZE
+    )
+    shutil.move(exported_dir, OPENVINO_MODEL_DIR)
+    logger.info("OpenVINO INT8 model cached at: %s", OPENVINO_MODEL_DIR)
+    return OPENVINO_MODEL_DIR
+
+def create_backend(weights: str) -> AutoBackend:
+    """Load one raw inference backend (PyTorch, OpenVINO or TensorRT) for a worker"""
+    if weights.endswith(".pt"):
+        # YOLO() resolves and downloads the checkpoint; the backend wraps its nn.Module
+        weights = YOLO(weights).model
+    backend = AutoBackend(weights, device=inference_device, fp16=inference_device.type == "cuda", verbose=False)
+    if getattr(backend, "xml", False):
+        # OpenVINO's CPU plugin runs on TBB and ignores OMP_NUM_THREADS / torch.set_num_threads,
+        # so recompile the IR capped to this worker's share of the cores
+        import openvino as ov
+
+        core = ov.Core()
+        backend.ov_compiled_model = core.compile_model(
+            core.read_model(next(Path(weights).glob("*.xml"))),
+            "CPU",
+            {
+                "PERFORMANCE_HINT": getattr(backend, "inference_mode", "LATENCY"),
+                "INFERENCE_NUM_THREADS": THREADS_PER_WORKER,
+            },
+        )
+    return backend
 
 def load_yolo_model():
-    global model
-    print(f"Loading YOLO model: {YOLO_MODEL}...")
-    # YOLOv5n will be automatically downloaded from Ultralytics
-    model = YOLO(YOLO_MODEL)
-    print("YOLO model loaded successfully")
-    print(f"Model device: {model.device}")
-    print(f"Model names: {list(model.names.values())}")
-
-# --- WebRTC Video Processing ---
-class VideoTransformTrack(MediaStreamTrack):
-    """
-    A video stream track that passes through frames without modification.
-    Detection is now handled via API calls from the frontend.
+    global model, model_batch_size, model_dynamic_shapes, class_names, class_name_to_id
+    torch.set_num_threads(THREADS_PER_WORKER)
+    cv2.setNumThreads(THREADS_PER_WORKER)  # Letterbox resize runs on the same workers
+    exported = None  # Cached TensorRT engine / OpenVINO IR, if one is in use
+    if torch.cuda.is_available():
+        try:
+            exported = export_tensorrt_fp16()
+        except Exception as e:
+            logger.warning("TensorRT export failed, falling back to PyTorch: %s", e)
+    elif USE_OPENVINO:
+        try:
+            exported = export_openvino_int8()
+        except Exception as e:
+            logger.warning("OpenVINO export failed, falling back to PyTorch: %s", e)
+
+    backends = None
+    if exported is not None:
+        logger.info("Loading YOLO model: %s...", exported)
+        try:
+            backends = [create_backend(str(exported)) for _ in range(INFERENCE_WORKERS)]
+        except Exception as e:
+            # Stale engine (driver/TensorRT/GPU change) or half-written IR: drop it so the next boot rebuilds it
+            logger.warning("Cached export %s failed to load, removing it and falling back to PyTorch: %s", exported, e)
+            if exported.is_dir():
+                shutil.rmtree(exported, ignore_errors=True)
+            else:
+                exported.unlink(missing_ok=True)
+        else:
+            if exported == TENSORRT_ENGINE:
+                # Static engine: frames are run one at a time, always at IMG_SIZE
+                model_batch_size = 1
+                model_dynamic_shapes = False
+    if backends is None:
+        logger.info("Loading YOLO model: %s...", YOLO_MODEL)
+        # YOLOv5n will be automatically downloaded from Ultralytics
+        backends = [create_backend(YOLO_MODEL) for _ in range(INFERENCE_WORKERS)]
+    model = backends[0]
+    for backend in backends:
+        model_pool.put(backend)
+    # Page-locked host buffers on CUDA: faster H2D copies that can run asynchronously.
+    # The device-side buffer is preallocated in the backend's input dtype, so the copy also does the FP16 cast.
+    on_cuda = inference_device.type == "cuda"
+    input_shape = (model_batch_size, 3, IMG_SIZE, IMG_SIZE)
+    input_dtype = torch.float16 if model.fp16 else torch.float32
+    for _ in range(INFERENCE_WORKERS):
+        host_buf = torch.empty(input_shape, dtype=torch.float32, pin_memory=on_cuda)
+        device_buf = torch.empty(input_shape, dtype=input_dtype, device=inference_device) if on_cuda else host_buf
+        input_buffers.put((host_buf, device_buf))
+    logger.info("YOLO model loaded successfully (%d inference workers)", INFERENCE_WORKERS)
+    logger.info("Model device: %s", model.device)
+    class_names = [model.names[i] for i in range(len(model.names))]
+    class_name_to_id = {name: i for i, name in enumerate(class_names)}
+    logger.debug("Model names: %s", class_names)
+
+# --- Detection Micro-Batching ---
+detection_queue = None  # asyncio.Queue of (img_array, class_ids, Future), created on startup
+batcher_task = None
+inference_pool = None  # ThreadPoolExecutor running blocking YOLO calls off the event loop
+inference_slots = None  # asyncio.Semaphore, one slot per inference worker
+batch_tasks = set()  # In-flight batches (keeps task references alive)
+
+def select_imgsz(frame: np.ndarray) -> int:
+    """Smallest inference size covering the frame's longest side (always IMG_SIZE on static engines)"""
+    if not model_dynamic_shapes:
+        return IMG_SIZE
+    longest_side = max(frame.shape[:2])
+    return next((size for size in INFERENCE_SIZES if size >= longest_side), IMG_SIZE)
+
+def input_view(buf: torch.Tensor, batch_size: int, imgsz: int) -> torch.Tensor:
+    """(batch_size, 3, imgsz, imgsz) contiguous view over the start of a preallocated input buffer"""
+    return buf.view(-1)[:batch_size * 3 * imgsz * imgsz].view(batch_size, 3, imgsz, imgsz)
+
+def run_inference(frames, class_ids):
+    """Letterbox frames into a pooled input buffer and run YOLO on a pooled backend.
+
+    Blocking: called on inference_pool. Returns one (N, 6) array per frame with
+    columns x1, y1, x2, y2, conf, cls in that frame's pixel coordinates, limited
+    to that frame's requested class ids. A frame that fails to letterbox gets its
+    exception instead, so it doesn't fail the rest of the batch.
     """
-    kind = "video"
+    # NMS only considers the union of requested classes; each frame is narrowed below
+    if any(ids is None for ids in class_ids):
+        classes = None
+    else:
+        classes = sorted(set().union(*class_ids))
 
-    def __init__(self, track, transform):
-        super().__init__()
-        self.track = track
-        self.transform = transform
+    backend = model_pool.get()
+    input_bufs = input_buffers.get()
+    try:
+        host_buf, device_buf = input_bufs
+        # One size per batch: the largest any of its frames needs
+        imgsz = max(select_imgsz(frame) for frame in frames)
+        host_batch = input_view(host_buf, len(frames), imgsz)
+        host_slots = host_batch.numpy()
+
+        # Letterbox each frame on its own; good frames are packed into the leading slots
+        detections = [None] * len(frames)
+        letterboxed = []  # (frame index, (ratio, pad_x, pad_y)) in slot order
+        for index, frame in enumerate(frames):
+            try:
+                letterboxed.append((index, letterbox_into(frame, host_slots[len(letterboxed)])))
+            except Exception as e:
+                detections[index] = e
+        if not letterboxed:
+            return detections
+
+        host_batch = host_batch[:len(letterboxed)]
+        with torch.inference_mode():
+            batch = input_view(device_buf, len(letterboxed), imgsz)
+            if device_buf is not host_buf:
+                # The boxes' .cpu() below syncs the stream before the buffers go back to the pool
+                batch.copy_(host_batch, non_blocking=True)
+            preds = backend(batch)
+            if isinstance(preds, (list, tuple)):
+                preds = preds[0]  # PyTorch heads also return per-level feature maps
+            results = non_max_suppression(preds, classes)
+
+        for result, (index, (ratio, pad_x, pad_y)) in zip(results, letterboxed):
+            frame, ids = frames[index], class_ids[index]
+            # Single device->host transfer for every box of this frame
+            data = result.cpu().numpy()
+            if ids is not None and (classes is None or len(ids) != len(classes)):
+                data = data[np.isin(data[:, 5], ids)]
+            data[:, [0, 2]] = ((data[:, [0, 2]] - pad_x) / ratio).clip(0, frame.shape[1])
+            data[:, [1, 3]] = ((data[:, [1, 3]] - pad_y) / ratio).clip(0, frame.shape[0])
+            detections[index] = data
+        return detections
+    finally:
+        input_buffers.put(input_bufs)
+        model_pool.put(backend)
 
-    async def recv(self):
-        frame = await self.track.recv()
-        # Simply pass through the frame - detection is handled via API
-        return frame
+def warmup_models():
+    """Run dummy batches through every pooled backend so the first real request hits warm kernels"""
+    sizes = INFERENCE_SIZES if model_dynamic_shapes else (IMG_SIZE,)
+    batch_sizes = sorted({1, model_batch_size})
+    logger.info(
+        "Warming up YOLO (input sizes %s, batch sizes %s)...",
+        ", ".join(map(str, sizes)), ", ".join(map(str, batch_sizes))
+    )
+    for size in sizes:
+        dummy_frame = np.zeros((size, size, 3), dtype=np.uint8)
+        for batch_size in batch_sizes:
+            # SimpleQueue is FIFO, so consecutive calls cycle through every pooled backend
+            for _ in range(INFERENCE_WORKERS):
+                run_inference([dummy_frame] * batch_size, [None] * batch_size)
+
+async def run_batch(batch):
+    """Run one batch on a worker thread and resolve each request's future"""
+    frames = [img_array for img_array, _, _ in batch]
+    class_ids = [ids for _, ids, _ in batch]
+    try:
+        results = await asyncio.get_running_loop().run_in_executor(
+            inference_pool, run_inference, frames, class_ids
+        )
+    except Exception as e:
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(e)
+        return
+    finally:
+        inference_slots.release()
+
+    for (_, _, future), result in zip(batch, results):
+        if future.done():
+            continue
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+async def batch_inference_loop():
+    """Coalesce concurrent /detect frames into batched YOLO calls"""
+    loop = asyncio.get_running_loop()
+    while True:
+        # Wait for a free worker first so frames keep accumulating while all workers are busy
+        await inference_slots.acquire()
+        batch = [await detection_queue.get()]
+        deadline = loop.time() + MAX_QUEUE_DELAY
+        while len(batch) < model_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(detection_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        task = asyncio.create_task(run_batch(batch))
+        batch_tasks.add(task)
+        task.add_done_callback(batch_tasks.discard)
 
 # --- API Models ---
 class OfferModel(BaseModel):
     sdp: str
     type: str
     
+# Class narrowing is opt-in: no queries (or none naming a known class) returns every class
+DEFAULT_QUERIES: list[str] = []
+
 class DetectionRequest(BaseModel):
     image: str
-    queries: list[str] = ["person", "car", "bicycle", "motorcycle", "bus", "truck", "dog", "cat", "laptop", "phone", "book", "chair", "table", "cup", "bottle","Pen"]
+    queries: list[str] = DEFAULT_QUERIES
 
 # --- API Endpoints ---
 @app.on_event("startup")
 async def startup_event():
+    global detection_queue, batcher_task, inference_pool, inference_slots, real_ip, qr_code_png, network_info_json
     load_yolo_model()
-    print("\n" + "="*50)
-    print("WebRTC YOLO Object Detection Server is running!")
-    print(f"API is available at: http://localhost:{PORT}")
-    print("="*50 + "\n")
+    warmup_models()
+    real_ip = get_local_ip()
+    network_info_json = orjson.dumps(build_network_info(real_ip))
+    phone_url = f"https://{real_ip}:3443/phone"  # Use HTTPS for mobile camera access
+    logger.info("Generating QR code for: %s", phone_url)
+    qr_code_png = generate_qr_code(phone_url)
+    detection_queue = asyncio.Queue()
+    inference_pool = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="yolo")
+    inference_slots = asyncio.Semaphore(INFERENCE_WORKERS)
+    batcher_task = asyncio.create_task(batch_inference_loop())
+    logger.info("WebRTC YOLO Object Detection Server is running!")
+    logger.info("API is available at: http://localhost:%d", PORT)
 
 @app.get("/")
 async def get_root():
@@ -156,37 +507,14 @@ async def get_root():
 
 @app.get("/network-info")
 async def get_network_info():
-    """Get network information for mobile access with both localhost and real IP options"""
-    real_ip = get_local_ip()
-    frontend_port_http = 3000  # HTTP Frontend port
-    frontend_port_https = 3443  # HTTPS Frontend port
-    
-    return {
-        "real_ip": real_ip,
-        "localhost_ip": "localhost",
-        # HTTP URLs (for localhost/desktop)
-        "localhost_url": f"http://localhost:{frontend_port_http}",
-        "localhost_phone_url": f"http://localhost:{frontend_port_http}/phone",
-        # HTTPS URLs (for mobile access)
-        "real_ip_url": f"https://{real_ip}:{frontend_port_https}",
-        "real_ip_phone_url": f"https://{real_ip}:{frontend_port_https}/phone",
-        # Backward compatibility
-        "local_ip": real_ip,
-        "frontend_url": f"https://{real_ip}:{frontend_port_https}",
-        "phone_url": f"https://{real_ip}:{frontend_port_https}/phone"
-    }
+    """Get network information for mobile access with both localhost and real IP options (encoded on startup)"""
+    return Response(content=network_info_json, media_type="application/json")
 
 @app.get("/qr-code")
 async def get_qr_code():
-    """Generate QR code for phone interface access using HTTPS and real IP"""
-    real_ip = get_local_ip()
-    phone_url = f"https://{real_ip}:3443/phone"  # Use HTTPS for mobile camera access
-    
-    print(f"Generating QR code for: {phone_url}")
-    qr_bytes = generate_qr_code(phone_url)
-    
-    return StreamingResponse(
-        io.BytesIO(qr_bytes),
+    """Serve the QR code for phone interface access (HTTPS + real IP), rendered on startup"""
+    return Response(
+        content=qr_code_png,
         media_type="image/png",
         headers={"Content-Disposition": "inline; filename=phone_qr.png"}
     )
@@ -200,7 +528,7 @@ async def offer(params: OfferModel):
     
     @pc.on("connectionstatechange")
     async def on_connectionstatechange():
-        print(f"Connection state is {pc.connectionState}")
+        logger.info("Connection state is %s", pc.connectionState)
         if pc.connectionState == "failed":
             await pc.close()
             pcs.discard(pc)
@@ -208,9 +536,10 @@ async def offer(params: OfferModel):
     # Handle incoming tracks
     @pc.on("track")
     def on_track(track):
-        print(f"Track {track.kind} received")
+        logger.info("Track %s received", track.kind)
         if track.kind == "video":
-            pc.addTrack(VideoTransformTrack(relay.subscribe(track), transform="detect"))
+            # Detection is handled via API calls from the frontend, so frames are relayed untouched
+            pc.addTrack(relay.subscribe(track))
     
     # Set remote description
     await pc.setRemoteDescription(offer)
@@ -221,87 +550,89 @@ async def offer(params: OfferModel):
     
     return {"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}
 
-@app.post("/detect")
-async def detect_objects(detection: DetectionRequest):
+async def run_detection(image_bytes: bytes, queries: list[str]):
+    """Decode an encoded frame, run it through the batcher and build the detection response"""
+    # An undecodable upload is a client error, not a server one
     try:
-        # Decode base64 image
-        image_data = detection.image
-        if "base64," in image_data:
-            image_data = image_data.split("base64,")[1]
-            
-        image_bytes = base64.b64decode(image_data)
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        
-        print(f"Processing image of size: {image.size}")
-        
-        # Convert PIL image to numpy array for YOLO
-        img_array = np.array(image)
-        
-        # Run YOLO inference
-        results = model(img_array, conf=0.25, iou=0.45)  # confidence and IoU thresholds
+        img_array = decode_frame(image_bytes)
+    except (ValueError, cv2.error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+    
+    try:
+        logger.debug("Processing image of size: %dx%d", img_array.shape[1], img_array.shape[0])
         
-        # YOLO class names (COCO dataset)
-        class_names = [
-            'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck', 'boat',
-            'traffic light', 'fire hydrant', 'stop sign', 'parking meter', 'bench', 'bird', 'cat',
-            'dog', 'horse', 'sheep', 'cow', 'elephant', 'bear', 'zebra', 'giraffe', 'backpack',
-            'umbrella', 'handbag', 'tie', 'suitcase', 'frisbee', 'skis', 'snowboard', 'sports ball',
-            'kite', 'baseball bat', 'baseball glove', 'skateboard', 'surfboard', 'tennis racket',
-            'bottle', 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl', 'banana', 'apple',
-            'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza', 'donut', 'cake',
-            'chair', 'couch', 'potted plant', 'bed', 'dining table', 'toilet', 'tv', 'laptop',
-            'mouse', 'remote', 'keyboard', 'cell phone', 'microwave', 'oven', 'toaster', 'sink',
-            'refrigerator', 'book', 'clock', 'vase', 'scissors', 'teddy bear', 'hair drier', 'toothbrush'
-        ]
+        # Queue the frame for the batcher and wait for its result
+        future = asyncio.get_running_loop().create_future()
+        await detection_queue.put((img_array, query_class_ids(queries), future))
+        data = await future
         
-        # Get requested object queries
-        requested_objects = detection.queries
-        print(f"Requested objects: {requested_objects}")
+        logger.debug("Requested objects: %s", queries)
         
-        # Process YOLO results - Return ALL detections without filtering
+        # Process YOLO results - already limited to the requested classes, if any
         detections = []
-        all_detected_objects = []  # For debugging
-        
-        for result in results:
-            boxes = result.boxes
-            if boxes is not None:
-                for i, box in enumerate(boxes):
-                    # Get class ID and confidence
-                    class_id = int(box.cls[0])
-                    confidence = float(box.conf[0])
-                    class_name = class_names[class_id]
-                    
-                    all_detected_objects.append(f"{class_name}({confidence:.2f})")
-                    
-                    # Return ALL detections above a minimum confidence threshold
-                    if confidence > 0.25:  # Lower threshold to see more detections
-                        # Get bounding box coordinates (xyxy format)
-                        x1, y1, x2, y2 = box.xyxy[0].tolist()
-                        
-                        detection_item = {
-                            "label": class_name,
-                            "score": confidence,
-                            "box": [x1, y1, x2, y2]
-                        }
-                        detections.append(detection_item)
-        
-        print(f"All detected objects: {all_detected_objects}")
-        print(f"Returned detections (conf > 0.25): {len(detections)}")
+        if len(data):
+            # Columns are x1, y1, x2, y2, conf, cls; NMS already dropped boxes at or below CONF_THRESHOLD
+            class_ids = data[:, 5].astype(int)
+            confidences = data[:, 4]
+            detections = [
+                {
+                    "label": class_names[class_id],
+                    "score": float(conf),
+                    "box": box
+                }
+                for class_id, conf, box in zip(class_ids, confidences, data[:, :4].tolist())
+            ]
+            
+            if logger.isEnabledFor(logging.DEBUG):
+                all_detected_objects = [
+                    f"{class_names[c]}({conf:.2f})" for c, conf in zip(class_ids, confidences)
+                ]
+                logger.debug("All detected objects: %s", all_detected_objects)
         
-        print(f"Final detections count: {len(detections)}")
+        logger.debug("Returned detections (conf > %s): %d", CONF_THRESHOLD, len(detections))
         return {"detections": detections}
         
     except Exception as e:
-        print(f"Detection error: {e}")
-        import traceback
-        traceback.print_exc()
-        return JSONResponse(
+        logger.exception("Detection error: %s", e)
+        return ORJSONResponse(
             status_code=500,
             content={"error": str(e)}
         )
 
+@app.post("/detect")
+async def detect_objects(detection: DetectionRequest):
+    # Decode base64 image
+    image_data = detection.image
+    if "base64," in image_data:
+        image_data = image_data.split("base64,")[1]
+    
+    try:
+        image_bytes = base64.b64decode(image_data)
+    except binascii.Error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid base64 image: {e}")
+    
+    return await run_detection(image_bytes, detection.queries)
+
+@app.post("/detect-bin")
+async def detect_objects_binary(file: UploadFile = File(...), queries: str = Form(None)):
+    """Same as /detect, but takes the raw JPEG/PNG bytes as a multipart upload (no base64 on the wire)"""
+    try:
+        requested_objects = orjson.loads(queries) if queries else DEFAULT_QUERIES
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid queries JSON: {e}")
+    if not isinstance(requested_objects, list) or not all(isinstance(q, str) for q in requested_objects):
+        raise HTTPException(status_code=400, detail="queries must be a JSON list of strings")
+    
+    image_bytes = await file.read()
+    return await run_detection(image_bytes, requested_objects)
+
 @app.on_event("shutdown")
 async def shutdown_event():
+    if batcher_task is not None:
+        batcher_task.cancel()
+    if inference_pool is not None:
+        inference_pool.shutdown(wait=False)
+
     # Close all peer connections
     coros = [pc.close() for pc in pcs]
     await asyncio.gather(*coros)